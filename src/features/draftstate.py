@@ -5,6 +5,9 @@ from .draft import Draft
 class InvalidDraftState(Exception):
     pass
 
+class FrozenDraftState(Exception):
+    pass
+
 class DraftState:
     """
     Args:
@@ -46,6 +49,12 @@ class DraftState:
     BAN_PHASE = Draft.BAN
     PICK_PHASE = Draft.PICK
 
+    __slots__ = ("num_champions", "num_positions", "num_actions", "state_index_to_champ_id", "champ_id_to_state_index",
+                 "state", "picks", "bans", "selected_pos", "team", "draft_structure", "BAN_PHASE_LENGTHS", "PICK_PHASE_LENGTHS",
+                 "positions", "pos_indices", "pos_to_pos_index", "pos_index_to_pos",
+                 "_pick_mask", "_ban_mask", "_position_mask", "_num_opponent_picks", "_duplicate_submission", "_duplicate_role",
+                 "_state_code", "_valid_actions", "_frozen")
+
     def __init__(self, team, champ_ids = get_champion_ids(), num_positions = 5, draft = Draft('default')):
         #TODO (Devin): This should make sure that numChampions >= num_positions
         self.num_champions = len(champ_ids)
@@ -72,6 +81,110 @@ class DraftState:
         self.pos_to_pos_index = dict(zip(self.positions,self.pos_indices))
         self.pos_index_to_pos = dict(zip(self.pos_indices,self.positions))
 
+        # Bitsets (indexed by champion id) of submitted picks and bans and (indexed by position) of filled positions.
+        # These allow evaluate() to check for repeated submissions without searching the pick and ban lists.
+        self._pick_mask = 0
+        self._ban_mask = 0
+        self._position_mask = 0
+        self._num_opponent_picks = 0
+        self._duplicate_submission = False
+        self._duplicate_role = False
+
+        # Cached results of evaluate() and get_valid_actions() for the current state.
+        # These are cleared whenever the state is changed.
+        self._state_code = None
+        self._valid_actions = None
+
+        # Frozen states can no longer be updated (see freeze())
+        self._frozen = False
+
+    def _record_submission(self, champion_id, position):
+        """
+        Records a (non-NULL) submission in the pick, ban, and position bitsets.
+        Args:
+            champion_id (int): id of submitted champion
+            position (int): position of submission (-1 for bans, 0 for opponent picks)
+        """
+        champion_bit = 1 << champion_id
+        if(position == -1):
+            if(self._ban_mask & champion_bit):
+                self._duplicate_submission = True
+            self._ban_mask |= champion_bit
+            return
+
+        if(self._pick_mask & champion_bit):
+            self._duplicate_submission = True
+        self._pick_mask |= champion_bit
+        if(position == 0):
+            self._num_opponent_picks += 1
+        else:
+            position_bit = 1 << position
+            if(self._position_mask & position_bit):
+                self._duplicate_role = True
+            self._position_mask |= position_bit
+
+    def _check_not_frozen(self):
+        """
+        Raises FrozenDraftState if the state has been frozen and can't be changed.
+        """
+        if(self._frozen):
+            raise FrozenDraftState("Attempting to change a frozen draft state. Use copy() to obtain a state which can be updated.")
+
+    def _clear_cache(self):
+        """
+        Clears cached evaluations of the current state. Must be called whenever the state is changed.
+        """
+        self._state_code = None
+        self._valid_actions = None
+
+    def copy(self):
+        """
+        Returns a copy of the draft state which can be updated independently of this one (even if this state is frozen). This is much cheaper than
+        deepcopy() since only the state matrix and submission lists are duplicated. The remaining attributes
+        are never changed after initialization and are shared between the copies.
+        Args:
+            None
+        Returns:
+            DraftState copy of self
+        """
+        new_state = object.__new__(DraftState)
+        for attr in DraftState.__slots__:
+            setattr(new_state, attr, getattr(self, attr))
+        new_state.state = self.state.copy()
+        new_state.picks = list(self.picks)
+        new_state.bans = list(self.bans)
+        new_state.selected_pos = list(self.selected_pos)
+        new_state._frozen = False
+        return new_state
+
+    def freeze(self):
+        """
+        Marks the draft state as final. Any further attempt to update a frozen state raises FrozenDraftState, so frozen states
+        may be safely shared (for example between stored experiences) without defensive copies.
+        Args:
+            None
+        Returns:
+            self
+        """
+        self._frozen = True
+        self.state.flags.writeable = False
+        return self
+
+    def __getstate__(self):
+        return {attr:getattr(self, attr) for attr in DraftState.__slots__}
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled draft state (for example one sent from a worker process). Pickling doesn't preserve the read-only flags of
+        numpy arrays, so they are re-applied to the cached valid actions and (if the state was frozen) to the state matrix.
+        """
+        for (attr, value) in state.items():
+            setattr(self, attr, value)
+        if(self._valid_actions is not None):
+            self._valid_actions.flags.writeable = False
+        if(self._frozen):
+            self.freeze()
+
     def reset(self):
         """
         Resets draft state back to default values.
@@ -80,10 +193,18 @@ class DraftState:
         Returns:
             None
         """
+        self._check_not_frozen()
         self.state[:] = False
         self.picks = []
         self.bans = []
         self.selected_pos = []
+        self._pick_mask = 0
+        self._ban_mask = 0
+        self._position_mask = 0
+        self._num_opponent_picks = 0
+        self._duplicate_submission = False
+        self._duplicate_role = False
+        self._clear_cache()
 
     def get_valid_actions(self, form="mask"):
         """
@@ -96,7 +217,11 @@ class DraftState:
                 otherwise actions are returned as a boolean mask
 
         If the draft is complete or in an invalid state, get_valid_actions will return an empty list of actions.
+        The mask is computed once per state and returned as a read-only array.
         """
+        if(form != "list" and self._valid_actions is not None):
+            return self._valid_actions
+
         # Check if draft is complete or invalid
         if(self.evaluate()):
             if(form == "list"):
@@ -120,7 +245,9 @@ class DraftState:
         if(form == "list"):
             return np.nonzero(valid_actions.reshape(-1))
         else:
-            return valid_actions.reshape(-1)
+            self._valid_actions = valid_actions.reshape(-1)
+            self._valid_actions.flags.writeable = False
+            return self._valid_actions
 
     def is_submission_legal(self, champion_id, position):
         """
@@ -199,12 +326,12 @@ class DraftState:
         Args:
             None
         Returns:
-            A copy of self.state
+            A flattened view of self.state as a uint8 vector
         """
         if(self.evaluate() in DraftState.invalid_states):
             raise InvalidDraftState("Attempting to format an invalid draft state for network input with code {}".format(self.evaluate()))
 
-        return self.state.reshape(-1)
+        return self.state.reshape(-1).view(np.uint8)
 
     def format_secondary_inputs(self):
         """
@@ -250,10 +377,10 @@ class DraftState:
         never output pos = 0.
         """
         # 'actionable state' is the sub-state of the state matrix with 'enemy picks' column removed.
-        actionable_state = self.state[:,1:]
-        if(action not in range(actionable_state.size)):
-            raise "Invalid action to format_action()!"
-        (state_index, position_index) = np.unravel_index(action,actionable_state.shape)
+        # Actions index into the flattened (num_champions, num_positions+1) actionable state in row-major order.
+        if(not 0 <= action < self.num_actions):
+            raise ValueError("Invalid action to format_action()!")
+        (state_index, position_index) = divmod(int(action), self.num_positions+1)
         # Action corresponds to a submission that we are allowed to make, ie. a pick or a ban.
         # We can't make submissions to the enemy team, so the indicies corresponding to these actions are removed.
         # position_index needs to be shifted by 1 in order to correctly index into full state array
@@ -279,14 +406,14 @@ class DraftState:
         """
         state_index = self.get_state_index(champion_id)
         pos_index = self.get_position_index(position)
-        if ((state_index==-1) or (pos_index not in range(1,self.state.shape[1]))):
+        if ((state_index==-1) or (not 1 <= pos_index < self.num_positions+2)):
             print("Invalid state index or position out of range!")
             print("cid = {}".format(champion_id))
             print("pos = {}".format(position))
             return -1
         # Convert position index for full state matrix into index for actionable state
         pos_index -= 1
-        action = np.ravel_multi_index((state_index,pos_index),self.state[:,1:].shape)
+        action = state_index*(self.num_positions+1) + pos_index
         return action
 
     def update(self, champion_id, position):
@@ -300,10 +427,12 @@ class DraftState:
                 position = 0 -> champion selection submitted by the opposing team.
                 0 < position <= num_positions -> champion selection submitted by our team for pos = position
         """
+        self._check_not_frozen()
         # Special case for NULL ban submitted.
         if (champion_id is None and position == -1):
             # Only append NULL bans to ban list (nothing done to state matrix)
             self.bans.append(champion_id)
+            self._clear_cache()
             return True
 
         # Submitted picks of the form (champ_id, pos) correspond with the selection champion = champion_id in position = pos.
@@ -321,6 +450,8 @@ class DraftState:
             self.selected_pos.append(position)
 
         self.state[index,pos_index] = True
+        self._record_submission(champion_id, position)
+        self._clear_cache()
         return True
 
     def display(self):
@@ -351,7 +482,7 @@ class DraftState:
         Args:
             champion_id (int): Id of champion to check for valid selection.
         """
-        return ((champion_id not in self.picks) and valid_champion_id(champion_id))
+        return (valid_champion_id(champion_id) and not (self._pick_mask >> champion_id) & 1)
 
     def can_ban(self, champion_id):
         """
@@ -360,7 +491,7 @@ class DraftState:
         Args:
             champion_id (int): Id of champion to check for valid ban.
         """
-        return ((champion_id not in self.bans) and valid_champion_id(champion_id))
+        return (valid_champion_id(champion_id) and not (self._ban_mask >> champion_id) & 1)
 
     def add_pick(self, champion_id, position):
         """
@@ -370,6 +501,7 @@ class DraftState:
             champion_id (int): Id of champion to add to pick list.
             position (int): Position of champion to be selected. If position = 0 this is interpreted as a selection submitted by the opposing team.
         """
+        self._check_not_frozen()
         if((position < 0) or (position > self.num_positions) or (not valid_champion_id(champion_id))):
             return False
         self.picks.append(champion_id)
@@ -377,6 +509,8 @@ class DraftState:
         index = self.get_state_index(champion_id)
         pos_index = self.get_position_index(position)
         self.state[index,pos_index] = True
+        self._record_submission(champion_id, position)
+        self._clear_cache()
         return True
 
     def add_ban(self, champion_id):
@@ -386,11 +520,14 @@ class DraftState:
         Args:
             champion_id (int): Id of champion to add to bans.
         """
+        self._check_not_frozen()
         if(not valid_champion_id(champion_id)):
             return False
         self.bans.append(champion_id)
         index = self.get_state_index(champion_id)
         self.state[index,self.get_position_index(-1)] = True
+        self._record_submission(champion_id, -1)
+        self._clear_cache()
         return True
 
     def evaluate(self):
@@ -405,25 +542,31 @@ class DraftState:
                 value = DUPLICATE_SUBMISSION -> state has a champion drafted which is already part of the opposing team or has already been selected by our team.
                 value = DUPLICATE_ROLE -> state has multiple champions selected for a single role
                 value = INVALID_SUBMISSION -> state has a submission that was included out of the draft phase order (ex pick during ban phase / ban during pick phase)
+
+        The result is computed once per state and cached until the state is changed.
+        """
+        if(self._state_code is None):
+            self._state_code = self._evaluate()
+        return self._state_code
+
+    def _evaluate(self):
+        """
+        Computes the state code returned by evaluate() for the current state.
         """
         # Check for duplicate submissions appearing in picks or bans
-        duplicate_picks = set([cid for cid in self.picks if self.picks.count(cid)>1])
-        # Need to remove possible NULL bans as duplicates (since these may be legitimate)
-        duplicate_bans = set([cid for cid in self.bans if self.bans.count(cid)>1]).difference(set([None]))
-        if(len(duplicate_picks)>0 or len(duplicate_bans)>0):
+        # (NULL bans may legitimately appear more than once and are never recorded as duplicates)
+        if(self._duplicate_submission):
             return DraftState.DUPLICATE_SUBMISSION
 
         # Check for submissions appearing in both picks and bans
-        if(len(set(self.picks).intersection(set(self.bans)))>0):
+        if(self._pick_mask & self._ban_mask):
             # Invalid state includes an already banned champion
             return DraftState.BAN_AND_SUBMISSION
 
         # Check for different champions that have been submitted for the same role
-        for pos in range(2,self.num_positions+2):
-            loc = np.argwhere(self.state[:,pos])
-            if(len(loc)>1):
-                # Invalid state includes multiple champions intended for the same role.
-                return DraftState.DUPLICATE_ROLE
+        if(self._duplicate_role):
+            # Invalid state includes multiple champions intended for the same role.
+            return DraftState.DUPLICATE_ROLE
 
         # Check for out of phase submissions
         num_bans = len(self.bans)
@@ -437,7 +580,7 @@ class DraftState:
 
         # validation is tuple of form (target_ban_count, target_blue_pick_count, target_red_pick_count)
         validation = self.draft_structure.submission_dist[sub_count]
-        num_opponent_sub = np.count_nonzero(self.state[:,self.get_position_index(0)])
+        num_opponent_sub = self._num_opponent_picks
         num_ally_sub = num_picks - num_opponent_sub
         if self.team == DraftState.BLUE_TEAM:
             dist = (num_bans, num_ally_sub, num_opponent_sub)
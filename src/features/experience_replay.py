@@ -1,4 +1,5 @@
-import random
+import numpy as np
+from .draftstate import DraftState
 
 class ExperienceBuffer():
     """
@@ -8,18 +9,41 @@ class ExperienceBuffer():
         a  = action taken from state s
         r  = reward obtained for taking action a
         s' = ending state after taking action a
+    Experiences are encoded for network input as they are stored and each field is kept in its own preallocated numpy array, so that
+    samples drawn from the buffer can be fed to a network directly.
     Args:
         max_buffer_size (int): maximum number of experiences to store in the buffer, default value is 300.
     """
     def __init__(self, max_buffer_size = 300):
-        self.buffer = []
+        self.buffer = None
         self.buffer_size = max_buffer_size
         self.oldest_experience = 0
+        self._num_stored = 0
+
+    def _allocate(self, state):
+        """
+        Allocates the arrays holding each field of the stored experiences. Array shapes are taken from the input state.
+        Args:
+            state (DraftState): example state to be stored in the buffer
+        Returns:
+            None
+        """
+        formatted_state = state.format_state()
+        valid_actions = state.get_valid_actions()
+        self.buffer = {
+            "states":np.zeros((self.buffer_size,)+formatted_state.shape, dtype=np.uint8),
+            "valid_actions":np.zeros((self.buffer_size,)+valid_actions.shape, dtype=bool),
+            "actions":np.zeros(self.buffer_size, dtype=np.int32),
+            "rewards":np.zeros(self.buffer_size, dtype=np.float32),
+            "next_states":np.zeros((self.buffer_size,)+formatted_state.shape, dtype=np.uint8),
+            "next_valid_actions":np.zeros((self.buffer_size,)+valid_actions.shape, dtype=bool),
+            "terminal":np.zeros(self.buffer_size, dtype=bool),
+        }
 
     def store(self, experiences):
         """
         ExperienceBuffer.store stores the input list of experience tuples into the buffer. The expereince is stored in one of two ways:
-        1) If the buffer has space remaining, the experience is appended to the end
+        1) If the buffer has space remaining, the experience is written to the next free slot
         2) If the buffer is full, the input experience replaces the oldest experience in the buffer
 
         Args:
@@ -28,28 +52,158 @@ class ExperienceBuffer():
             None
         """
         for experience in experiences:
-            if len(self.buffer) < self.buffer_size:
-                self.buffer.append(experience)
-            else:
-                self.buffer[self.oldest_experience] = experience
-                self.oldest_experience += 1
-                self.oldest_experience = self.oldest_experience % self.buffer_size
+            self._store_experience(experience)
         return None
 
+    def _store_experience(self, experience):
+        """
+        Encodes a single experience tuple (s, a, r, s') into the next available slot in the buffer.
+        Args:
+            experience (tuple): experience of the form (s, a, r, s')
+        Returns:
+            index (int): index of the slot the experience was stored in
+        """
+        (start, action, reward, end) = experience
+        if self.buffer is None:
+            self._allocate(start)
+
+        if self._num_stored < self.buffer_size:
+            index = self._num_stored
+            self._num_stored += 1
+        else:
+            index = self.oldest_experience
+            self.oldest_experience += 1
+            self.oldest_experience = self.oldest_experience % self.buffer_size
+
+        self.buffer["states"][index] = start.format_state()
+        self.buffer["valid_actions"][index] = start.get_valid_actions()
+        self.buffer["actions"][index] = start.get_action(*action)
+        self.buffer["rewards"][index] = reward
+
+        # Terminal states may be invalid and can't be formatted. Their ending state is left blank.
+        state_code = end.evaluate()
+        is_terminal = (state_code == DraftState.DRAFT_COMPLETE or state_code in DraftState.invalid_states)
+        self.buffer["terminal"][index] = is_terminal
+        self.buffer["next_states"][index] = 0 if is_terminal else end.format_state()
+        self.buffer["next_valid_actions"][index] = end.get_valid_actions()
+        return index
+
     def sample(self, sample_size):
         """
-        ExperienceBuffer.sample samples the current buffer using random.sample to return a collection of sample_size experiences from the replay buffer.
-        random.sample samples without replacement, so sample_size must be no larger than the length of the current buffer.
+        ExperienceBuffer.sample samples the current buffer without replacement to return a collection of sample_size experiences from the replay buffer.
+        sample_size must be no larger than the length of the current buffer.
 
         Args:
             sample_size (int): number of samples to take from buffer
         Returns:
-            sample (list(tuples)): list of experience replay samples. len(sample) = sample_size.
+            sample (dict(numpy array)): batch of experience replay samples indexed by field. Each array has length sample_size:
+                - "states", "valid_actions": formatted input states and their valid action masks
+                - "actions": index of the submitted action for each state
+                - "rewards": reward obtained for each submission
+                - "next_states", "next_valid_actions": formatted ending states (blank for terminal states) and their valid action masks
+                - "terminal": True if the submission ends the draft (or produces an invalid state)
         """
-        return random.sample(self.buffer,sample_size)
+        indices = np.random.choice(self._num_stored, sample_size, replace=False)
+        return {key:values[indices] for (key, values) in self.buffer.items()}
 
     def get_buffer_size(self):
         """
         Returns length of the buffer.
         """
-        return len(self.buffer)
+        return self._num_stored
+
+class PrioritizedExperienceBuffer(ExperienceBuffer):
+    """
+    PrioritizedExperienceBuffer is an ExperienceBuffer which samples experiences with probability proportional to their priority rather than uniformly
+    (see https://arxiv.org/abs/1511.05952). The priority of an experience is given by its most recently observed temporal-difference error d:
+        p = (|d| + epsilon)^alpha
+    New experiences are given the largest priority seen so far so that they are sampled at least once. Since sampling is no longer uniform, each
+    sample is returned with an importance-sampling weight w = (N*P(i))^(-beta) (normalized by the largest weight in the sample) which should be used
+    to scale its contribution to the loss.
+
+    Priorities are held in a sum-tree, so both sampling and updating priorities take O(log N) time.
+    Args:
+        max_buffer_size (int): maximum number of experiences to store in the buffer, default value is 300.
+        alpha (float): degree of prioritization used. alpha = 0 corresponds to uniform sampling.
+        beta (float): degree of importance-sampling correction used. beta = 1 fully compensates for non-uniform sampling.
+        epsilon (float): small constant which keeps experiences with zero error from never being sampled
+    """
+    def __init__(self, max_buffer_size = 300, alpha = 0.6, beta = 0.4, epsilon = 1.e-3):
+        super().__init__(max_buffer_size)
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self._max_priority = 1.0
+
+        # The sum-tree is stored as a flat array with the children of node k located at 2k+1 and 2k+2. The number of leaves is
+        # rounded up to a power of two so every leaf (one per buffer slot) is at the same depth. Node 0 holds the total priority.
+        self._tree_depth = int(np.ceil(np.log2(max(max_buffer_size, 2))))
+        self._num_leaves = 2**self._tree_depth
+        self._tree = np.zeros(2*self._num_leaves-1)
+
+    def _set_priority(self, index, priority):
+        """
+        Sets the priority of the experience stored at index and updates the sums held by its ancestors in the tree.
+        """
+        node = index + self._num_leaves - 1
+        change = priority - self._tree[node]
+        self._tree[node] = priority
+        while node > 0:
+            node = (node - 1) // 2
+            self._tree[node] += change
+
+    def _store_experience(self, experience):
+        index = super()._store_experience(experience)
+        self._set_priority(index, self._max_priority)
+        return index
+
+    def sample(self, sample_size):
+        """
+        PrioritizedExperienceBuffer.sample samples the current buffer (with replacement) according to the priority of each experience. The total
+        priority is split into sample_size equal segments and one experience is drawn from each.
+
+        Args:
+            sample_size (int): number of samples to take from buffer
+        Returns:
+            sample (dict(numpy array)): batch of experience replay samples indexed by field (see ExperienceBuffer.sample()), along with
+                - "indices": location of each sample in the buffer (used when updating priorities)
+                - "weights": importance-sampling weight for each sample
+        """
+        total_priority = self._tree[0]
+        segment = total_priority/sample_size
+        remaining = (np.arange(sample_size) + np.random.uniform(size=sample_size))*segment
+
+        # Walk down the tree for every sample at once. Go left if the remaining value falls within the left child's sum, otherwise
+        # subtract that sum and go right.
+        nodes = np.zeros(sample_size, dtype=np.int64)
+        for _ in range(self._tree_depth):
+            left = 2*nodes + 1
+            go_right = remaining > self._tree[left]
+            remaining = np.where(go_right, remaining - self._tree[left], remaining)
+            nodes = left + go_right
+        # Guard against round-off selecting one of the empty slots at the end of the buffer
+        indices = np.minimum(nodes - (self._num_leaves - 1), self._num_stored - 1)
+
+        probabilities = self._tree[indices + self._num_leaves - 1]/total_priority
+        weights = (self._num_stored*probabilities)**(-self.beta)
+        weights /= weights.max()
+
+        sample = {key:values[indices] for (key, values) in self.buffer.items()}
+        sample["indices"] = indices
+        sample["weights"] = weights.astype(np.float32)
+        return sample
+
+    def update_priorities(self, indices, errors):
+        """
+        Updates the priorities of sampled experiences using their latest temporal-difference errors.
+        Args:
+            indices (numpy array): location of each experience in the buffer (as returned by sample())
+            errors (numpy array): temporal-difference error for each experience
+        Returns:
+            None
+        """
+        priorities = (np.abs(errors) + self.epsilon)**self.alpha
+        for (index, priority) in zip(indices, priorities):
+            self._set_priority(index, priority)
+        self._max_priority = max(self._max_priority, priorities.max())
+        return None
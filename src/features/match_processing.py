@@ -5,6 +5,7 @@ from copy import deepcopy
 
 import random
 import json
+import numpy as np
 
 def process_match(match, team, augment_data=True):
     """
@@ -77,12 +78,12 @@ def process_match(match, team, augment_data=True):
             if finish_memory:
                 # This is case 1 to store memory
                 r = get_reward(draft, match, a, a)
-                s_next = deepcopy(draft)
+                s_next = draft.copy().freeze()
                 memory = (s, a, r, s_next)
                 experiences.append(memory)
                 finish_memory = False
             # Memory starts when upcoming pick belongs to designated team
-            s = deepcopy(draft)
+            s = draft.copy().freeze()
             # Store action = (champIndex, pos)
             a = (pick, position)
             finish_memory = True
@@ -101,7 +102,7 @@ def process_match(match, team, augment_data=True):
     if(draft.evaluate() == DraftState.DRAFT_COMPLETE):
         assert finish_memory == True
         r = get_reward(draft, match, a, a)
-        s_next = deepcopy(draft)
+        s_next = draft.copy().freeze()
         memory = (s, a, r, s_next)
         experiences.append(memory)
     else:
@@ -116,6 +117,33 @@ def process_match(match, team, augment_data=True):
 
     return experiences
 
+def process_match_experiences(match, teams):
+    """
+    Processes a single match into the experiences used for training from the perspective of each given team. NULL submissions are
+    removed since the learner isn't allowed to submit them. This has no dependence on the networks being trained so that it can be run
+    in worker processes.
+    Args:
+        match (dict): match to process
+        teams (list): teams (DraftState.BLUE_TEAM or DraftState.RED_TEAM) to take the perspective of when processing the match
+    Returns:
+        processed (list(tuple)): for each team with at least one experience, a tuple (experiences, states, valid_actions) holding the list of
+            experiences along with the stacked formatted starting states and valid actions for those experiences
+    """
+    processed = []
+    for team in teams:
+        # Process match into individual experiences
+        experiences = process_match(match, team)
+        # Some experiences include NULL submissions (usually missing bans)
+        # The learner isn't allowed to submit NULL picks so skip adding these
+        # to the buffer.
+        experiences = [exp for exp in experiences if exp[1][0] is not None]
+        if not experiences:
+            continue
+        states = np.stack([exp[0].format_state() for exp in experiences], axis=0)
+        valid_actions = np.stack([exp[0].get_valid_actions() for exp in experiences], axis=0)
+        processed.append((experiences, states, valid_actions))
+    return processed
+
 def build_action_queue(match):
     """
     Builds queue of champion picks or bans (depending on mode) in selection order. If mode = 'ban' this produces a queue of tuples
@@ -141,6 +141,7 @@ for match in matches:
                     next_row = df[df['act_id']==next_action_id]
                     next_rank = next_row['rank'].iloc[0]
                     if(next_rank < k):
+                        state = state.copy()
                         result = state.update(*next_action)
                         new_exp = (state, act, rew, None)
                         experiences[pick_count+1] = new_exp
@@ -55,7 +55,12 @@ class Qnetwork(base_model.BaseModel):
         if(self.target_name):
             self.target_ops = self.build_model(name = self.target_name)
             self.target_ops["target_init"] = self.create_target_initialization_ops(self.target_name, self.online_name)
-            self.target_ops["target_update"] = self.create_target_update_ops(self.target_name, self.online_name, tau=self._tau)
+            if(self._tau == 1.0):
+                # Updating with tau = 1.0 is a straight copy of the online network
+                self.target_ops["target_update"] = self.create_target_copy_ops(self.target_name, self.online_name, name="target_update")
+            else:
+                self.target_ops["target_update"] = self.create_target_update_ops(self.target_name, self.online_name, tau=self._tau)
+            self.online_ops.update(self.create_double_q_ops(self.target_name, self.online_name))
         with self._graph.as_default():
             self.online_ops["init"] = tf.global_variables_initializer()
         self.init_saver()
@@ -75,38 +80,17 @@ class Qnetwork(base_model.BaseModel):
         with self._graph.as_default():
             with tf.variable_scope(name):
                 ops_dict["learning_rate"] = tf.Variable(self._learning_rate, trainable=False, name="learning_rate")
+                # Learning rate schedules set new values through this op rather than adding assignments to the graph during training
+                ops_dict["new_learning_rate"] = tf.placeholder(tf.float32, shape=(), name="new_learning_rate")
+                ops_dict["set_learning_rate"] = ops_dict["learning_rate"].assign(ops_dict["new_learning_rate"], name="set_learning_rate")
 
                 # Incoming state matrices are of size input_size = (nChampions, nPos+2)
                 # 'None' here means the input tensor will flex with the number of training
-                # examples (aka batch size).
-                ops_dict["input"] = tf.placeholder(tf.float32, (None,)+self._input_shape, name="inputs")
+                # examples (aka batch size). States are binary so they are fed as uint8 and converted in the graph.
+                ops_dict["input"] = tf.placeholder(tf.uint8, (None,)+self._input_shape, name="inputs")
                 ops_dict["dropout_keep_prob"] = tf.placeholder_with_default(1.0,shape=())
 
-                # Fully connected (FC) layers:
-                fc0 = tf.layers.dense(
-                    ops_dict["input"],
-                    self._filter_sizes[0],
-                    activation=tf.nn.relu,
-                    bias_initializer=tf.constant_initializer(0.1),
-                    name="fc_0")
-                dropout0 = tf.nn.dropout(fc0, ops_dict["dropout_keep_prob"])
-
-                fc1 = tf.layers.dense(
-                    dropout0,
-                    self._filter_sizes[1],
-                    activation=tf.nn.relu,
-                    bias_initializer=tf.constant_initializer(0.1),
-                    name="fc_1")
-                dropout1 = tf.nn.dropout(fc1, ops_dict["dropout_keep_prob"])
-
-                # FC output layer
-                ops_dict["outQ"] = tf.layers.dense(
-                    dropout1,
-                    self._output_shape,
-                    activation=None,
-                    bias_initializer=tf.constant_initializer(0.1),
-                    kernel_regularizer=tf.contrib.layers.l2_regularizer(scale=self._regularization_coeff),
-                    name="q_vals")
+                ops_dict["outQ"] = self._build_q_layers(ops_dict["input"], ops_dict["dropout_keep_prob"])
 
                 # Placeholder for valid actions filter
                 ops_dict["valid_actions"] = tf.placeholder(tf.bool, shape=ops_dict["outQ"].shape, name="valid_actions")
@@ -142,33 +126,121 @@ class Qnetwork(base_model.BaseModel):
                 #  n_actions = outQ.shape[1]
                 ind = tf.stack([tf.range(tf.shape(ops_dict["actions"])[0]),ops_dict["actions"]],axis=1)
                 # and then "gather" them.
-                estimatedQ = tf.gather_nd(ops_dict["outQ"], ind)
+                ops_dict["estimated_Q"] = tf.gather_nd(ops_dict["outQ"], ind)
                 # Special notes: this is more efficient than indexing into the flattened version of outQ (which I have seen before)
                 # because the gather operation is applied to outQ directly. Apparently this propagates the gradient more efficiently
                 # under specific sparsity conditions (which tf.Variables like outQ satisfy)
 
                 # Simple sum-of-squares loss (error) function. Note that biases do not
                 # need to be regularized since they are (generally) not subject to overfitting.
-                ops_dict["loss"] = tf.reduce_mean(0.5*tf.square(ops_dict["target"]-estimatedQ), name="loss")
+                ops_dict["loss"] = tf.reduce_mean(0.5*tf.square(ops_dict["target"]-ops_dict["estimated_Q"]), name="loss")
 
                 ops_dict["trainer"] = tf.train.AdamOptimizer(learning_rate = ops_dict["learning_rate"])
                 ops_dict["update"] = ops_dict["trainer"].minimize(ops_dict["loss"], name="update")
 
         return ops_dict
 
+    def _build_q_layers(self, inputs, dropout_keep_prob):
+        """
+        Builds the fully connected layers mapping input states to estimated Q-values within the current variable scope.
+        Calling this again within a reusing scope evaluates the existing network on a new input.
+        Args:
+            inputs (tf.Tensor): [n_batch, *input_shape] tensor of (uint8) input states
+            dropout_keep_prob (tf.Tensor or float): probability of keeping each hidden unit
+        Returns:
+            outQ (tf.Tensor): [n_batch, output_shape] tensor of estimated Q-values
+        """
+        # Fully connected (FC) layers:
+        fc0 = tf.layers.dense(
+            tf.cast(inputs, tf.float32),
+            self._filter_sizes[0],
+            activation=tf.nn.relu,
+            bias_initializer=tf.constant_initializer(0.1),
+            name="fc_0")
+        dropout0 = tf.nn.dropout(fc0, dropout_keep_prob)
+
+        fc1 = tf.layers.dense(
+            dropout0,
+            self._filter_sizes[1],
+            activation=tf.nn.relu,
+            bias_initializer=tf.constant_initializer(0.1),
+            name="fc_1")
+        dropout1 = tf.nn.dropout(fc1, dropout_keep_prob)
+
+        # FC output layer
+        outQ = tf.layers.dense(
+            dropout1,
+            self._output_shape,
+            activation=None,
+            bias_initializer=tf.constant_initializer(0.1),
+            kernel_regularizer=tf.contrib.layers.l2_regularizer(scale=self._regularization_coeff),
+            name="q_vals")
+        return outQ
+
+    def create_double_q_ops(self, target_scope, online_scope):
+        """
+        Adds operations to graph which compute the double DQN target values for a batch of transitions (s,a,r,s')
+        and update the online network towards them, without leaving the graph.
+
+        Following https://arxiv.org/abs/1509.06461 the next action is chosen by the online network amongst the valid
+        actions for s', but is evaluated by the target network:
+            targetQ = r + gamma*Q'(s',argmax_a Q(s',a))
+        For terminating transitions the target is simply targetQ = r. Gradients are not propagated through the target.
+        Args:
+            target_scope (str): name of scope that target network occupies
+            online_scope (str): name of scope that online network occupies
+        Returns:
+            ops_dict (dict): placeholders for the next states ("next_input", "next_valid_actions"), rewards ("rewards"), terminal
+                flags ("terminal") and optional per-example loss weights ("weights", default 1.0) along with the resulting "double_q_target", "double_q_td_error", "double_q_loss" and "double_q_update" ops. The online
+                network's "input", "actions" and "dropout_keep_prob" are fed as usual.
+        """
+        ops_dict = {}
+        with self._graph.as_default():
+            with tf.name_scope("double_q"):
+                ops_dict["next_input"] = tf.placeholder(tf.uint8, (None,)+self._input_shape, name="next_inputs")
+                ops_dict["next_valid_actions"] = tf.placeholder(tf.bool, shape=(None, self._output_shape), name="next_valid_actions")
+                ops_dict["rewards"] = tf.placeholder(tf.float32, shape=[None], name="rewards")
+                # terminal[i] = 1.0 if s'[i] completes the draft (or is invalid) and 0.0 otherwise
+                ops_dict["terminal"] = tf.placeholder(tf.float32, shape=[None], name="terminal")
+                # Optional importance-sampling weights for each example (used with prioritized replay)
+                ops_dict["weights"] = tf.placeholder_with_default(tf.ones_like(ops_dict["rewards"]), shape=[None], name="weights")
+
+                # The target and loss computation is compiled with XLA (on CPU as well as GPU) so that its many small ops are fused.
+                # Training batches always have the same shape so this is only compiled once (plus once for the validation batch).
+                with tf.xla.experimental.jit_scope(compile_ops=True):
+                    # Evaluate next states with the existing weights of both networks (without dropout)
+                    with tf.variable_scope(online_scope, reuse=True):
+                        online_next_Q = self._build_q_layers(ops_dict["next_input"], 1.0)
+                    with tf.variable_scope(target_scope, reuse=True):
+                        target_next_Q = self._build_q_layers(ops_dict["next_input"], 1.0)
+
+                    valid_next_Q = tf.where(ops_dict["next_valid_actions"], online_next_Q, tf.scalar_mul(-np.inf,tf.ones_like(online_next_Q)))
+                    next_actions = tf.argmax(valid_next_Q, axis=1, output_type=tf.int32)
+                    ind = tf.stack([tf.range(tf.shape(next_actions)[0]),next_actions],axis=1)
+                    next_Q = tf.gather_nd(target_next_Q, ind)
+
+                    target = ops_dict["rewards"] + self._discount_factor*(1.-ops_dict["terminal"])*next_Q
+                    ops_dict["double_q_target"] = tf.stop_gradient(target, name="target_Q")
+                    ops_dict["double_q_td_error"] = tf.subtract(ops_dict["double_q_target"], self.online_ops["estimated_Q"], name="td_error")
+                    ops_dict["double_q_loss"] = tf.reduce_mean(0.5*ops_dict["weights"]*tf.square(ops_dict["double_q_td_error"]), name="loss")
+                ops_dict["double_q_update"] = self.online_ops["trainer"].minimize(ops_dict["double_q_loss"], name="update")
+        return ops_dict
+
     def create_target_update_ops(self, target_scope, online_scope, tau=1e-3, name="target_update"):
         """
         Adds operations to graph which are used to update the target network after after a training batch is sent
         through the online network.
 
         This function should be executed only once before training begins. The resulting operations should
-        be run within a tf.Session() once per training batch.
+        be run within a tf.Session() on a fixed schedule of training batches.
 
         In double-Q network learning, the online (primary) network is updated using traditional backpropegation techniques
         with target values produced by the target-Q network.
         To improve stability, the target-Q is updated using a linear combination of its current weights
         with the current weights of the online network:
             Q_target = tau*Q_online + (1-tau)*Q_target
+        which is applied in place as a single update per variable:
+            Q_target -= tau*(Q_target - Q_online)
         Typical tau values are small (tau ~ 1e-3). For more, see https://arxiv.org/abs/1509.06461 and https://arxiv.org/pdf/1509.02971.pdf.
         Args:
             target_scope (str): name of scope that target network occupies
@@ -180,7 +252,26 @@ class Qnetwork(base_model.BaseModel):
         with self._graph.as_default():
             target_params = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=target_scope)
             online_params = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=online_scope)
-            ops = [target_params[i].assign(tf.add(tf.multiply(tau,online_params[i]),tf.multiply(1.-tau,target_params[i]))) for i in range(len(target_params))]
+            ops = [target.assign_sub(tau*(target-online)) for (target, online) in zip(target_params, online_params)]
+            return tf.group(*ops,name=name)
+
+    def create_target_copy_ops(self, target_scope, online_scope, name="target_copy"):
+        """
+        Adds operations to graph which overwrite the target network with the current weights of the online network
+        (a "hard" update):
+            Q_target = Q_online
+        This is equivalent to create_target_update_ops() with tau = 1.0, but assigns each variable directly rather than
+        forming the linear combination. Hard updates are typically run every few thousand training batches.
+        Args:
+            target_scope (str): name of scope that target network occupies
+            online_scope (str): name of scope that online network occupies
+            name (str): name of operation which copies the online network when run within a session
+        Returns: Tensorflow operation which copies the online network into the target network when run.
+        """
+        with self._graph.as_default():
+            target_params = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=target_scope)
+            online_params = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=online_scope)
+            ops = [target.assign(online) for (target, online) in zip(target_params, online_params)]
             return tf.group(*ops,name=name)
 
     def create_target_initialization_ops(self, target_scope, online_scope):
@@ -196,4 +287,4 @@ class Qnetwork(base_model.BaseModel):
         Returns:
             Tensorflow operation (named "target_init") which initialize the target nework when run.
         """
-        return self.create_target_update_ops(target_scope, online_scope, tau=1.0, name="target_init")
+        return self.create_target_copy_ops(target_scope, online_scope, name="target_init")
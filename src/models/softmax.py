@@ -54,16 +54,19 @@ class SoftmaxNetwork(base_model.BaseModel):
         with self._graph.as_default():
             with tf.variable_scope(name):
                 ops_dict["learning_rate"] = tf.Variable(self._learning_rate, trainable=False, name="learning_rate")
+                # Learning rate schedules set new values through this op rather than adding assignments to the graph during training
+                ops_dict["new_learning_rate"] = tf.placeholder(tf.float32, shape=(), name="new_learning_rate")
+                ops_dict["set_learning_rate"] = ops_dict["learning_rate"].assign(ops_dict["new_learning_rate"], name="set_learning_rate")
 
                 # Incoming state matrices are of size input_size = (nChampions, nPos+2)
                 # 'None' here means the input tensor will flex with the number of training
-                # examples (aka batch size).
-                ops_dict["input"] = tf.placeholder(tf.float32, (None,)+self._input_shape, name="inputs")
+                # examples (aka batch size). States are binary so they are fed as uint8 and converted in the graph.
+                ops_dict["input"] = tf.placeholder(tf.uint8, (None,)+self._input_shape, name="inputs")
                 ops_dict["dropout_keep_prob"] = tf.placeholder_with_default(1.0,shape=())
 
                 # Fully connected (FC) layers:
                 fc0 = tf.layers.dense(
-                    ops_dict["input"],
+                    tf.cast(ops_dict["input"], tf.float32),
                     self._filter_sizes[0],
                     activation=tf.nn.relu,
                     bias_initializer=tf.constant_initializer(0.1),
@@ -1,4 +1,241 @@
-from features.draftstate import DraftState
+import random
+import pickle
+import numpy as np
+
+from features.draftstate import DraftState, FrozenDraftState
+from features.experience_replay import PrioritizedExperienceBuffer
+from data.champion_info import get_champion_ids
+
+def reference_evaluate(state):
+    """
+    Reference implementation of DraftState.evaluate() which recomputes the state code directly from the pick and ban lists and the
+    state matrix. DraftState tracks submissions incrementally using bitsets, so this is used to check that those stay consistent
+    with the lists and state they describe.
+    Args:
+        state (DraftState): state to evaluate
+    Returns:
+        value (int): code indicating validity of state (see DraftState.evaluate())
+    """
+    # Check for duplicate submissions appearing in picks or bans
+    duplicate_picks = set([cid for cid in state.picks if state.picks.count(cid)>1])
+    # Need to remove possible NULL bans as duplicates (since these may be legitimate)
+    duplicate_bans = set([cid for cid in state.bans if state.bans.count(cid)>1]).difference(set([None]))
+    if(len(duplicate_picks)>0 or len(duplicate_bans)>0):
+        return DraftState.DUPLICATE_SUBMISSION
+
+    # Check for submissions appearing in both picks and bans
+    if(len(set(state.picks).intersection(set(state.bans)))>0):
+        return DraftState.BAN_AND_SUBMISSION
+
+    # Check for different champions that have been submitted for the same role
+    for pos in range(2,state.num_positions+2):
+        if(len(np.argwhere(state.state[:,pos]))>1):
+            return DraftState.DUPLICATE_ROLE
+
+    # Check for out of phase submissions
+    num_bans = len(state.bans)
+    num_picks = len(state.picks)
+    sub_count = num_bans+num_picks
+    if(num_bans > state.draft_structure.NUM_BANS):
+        return DraftState.TOO_MANY_BANS
+    if(num_picks > state.draft_structure.NUM_PICKS):
+        return DraftState.TOO_MANY_PICKS
+
+    validation = state.draft_structure.submission_dist[sub_count]
+    num_opponent_sub = np.count_nonzero(state.state[:,state.get_position_index(0)])
+    num_ally_sub = num_picks - num_opponent_sub
+    if state.team == DraftState.BLUE_TEAM:
+        dist = (num_bans, num_ally_sub, num_opponent_sub)
+    else:
+        dist = (num_bans, num_opponent_sub, num_ally_sub)
+    if(dist != validation):
+        return DraftState.INVALID_SUBMISSION
+
+    if(num_ally_sub == state.num_positions and num_opponent_sub == state.num_positions):
+        return DraftState.DRAFT_COMPLETE
+    return 0
+
+def default_draft_submissions(team):
+    """
+    Returns a list of (champion_id, position) submissions making up a valid and complete default draft from the perspective of team.
+    """
+    champ_ids = get_champion_ids()
+    draft = DraftState(team).draft_structure
+    submissions = []
+    next_position = 1
+    for k in range(draft.NUM_BANS + draft.NUM_PICKS):
+        if(draft.get_active_phase(k) == DraftState.BAN_PHASE):
+            position = -1
+        elif(draft.get_active_team(k) == team):
+            position = next_position
+            next_position += 1
+        else:
+            position = 0
+        submissions.append((champ_ids[k], position))
+    return submissions
+
+def draft_state_from(submissions, team=DraftState.BLUE_TEAM):
+    state = DraftState(team)
+    for (cid, pos) in submissions:
+        state.update(cid, pos)
+    return state
+
+def test_evaluate_codes():
+    """
+    Checks that evaluate() produces each of the state codes for a fixed draft.
+    """
+    champ_ids = get_champion_ids()
+    for team in [DraftState.BLUE_TEAM, DraftState.RED_TEAM]:
+        submissions = default_draft_submissions(team)
+        assert(DraftState(team).evaluate() == 0)
+        for k in range(len(submissions)):
+            assert(draft_state_from(submissions[:k], team).evaluate() == 0)
+        assert(draft_state_from(submissions, team).evaluate() == DraftState.DRAFT_COMPLETE)
+
+    bans = default_draft_submissions(DraftState.BLUE_TEAM)[:6]
+    (first_pick, second_pick, third_pick) = champ_ids[6:9]
+    cases = [
+        # Repeated NULL bans are allowed
+        ([(None, -1), (None, -1)], 0),
+        ([(first_pick, -1), (first_pick, -1)], DraftState.DUPLICATE_SUBMISSION),
+        (bans+[(first_pick, 1), (second_pick, 0), (first_pick, 0)], DraftState.DUPLICATE_SUBMISSION),
+        (bans+[(bans[0][0], 1)], DraftState.BAN_AND_SUBMISSION),
+        (bans+[(first_pick, 1), (second_pick, 0), (third_pick, 0), (champ_ids[9], 1)], DraftState.DUPLICATE_ROLE),
+        ([(first_pick, 1)], DraftState.INVALID_SUBMISSION),
+        (bans+[(first_pick, 0)], DraftState.INVALID_SUBMISSION),
+        ([(cid, -1) for cid in champ_ids[:11]], DraftState.TOO_MANY_BANS),
+        ([(cid, 0) for cid in champ_ids[:11]], DraftState.TOO_MANY_PICKS),
+    ]
+    for (submissions, expected) in cases:
+        state = draft_state_from(submissions)
+        assert(state.evaluate() == expected), "Expected {} for {}, got {}".format(expected, submissions, state.evaluate())
+        assert(state.evaluate() == reference_evaluate(state))
+
+def test_evaluate_matches_reference(num_drafts=20000, seed=0):
+    """
+    Compares evaluate() against reference_evaluate() after each submission of randomly generated drafts. Submissions are drawn from a
+    small pool of champions (plus NULL bans and invalid ids) so that duplicates and role clashes are common.
+    """
+    rng = random.Random(seed)
+    champ_ids = get_champion_ids()
+    for _ in range(num_drafts):
+        state = DraftState(rng.choice([DraftState.BLUE_TEAM, DraftState.RED_TEAM]))
+        pool = rng.sample(champ_ids, 12) + [None, -1]
+        for _ in range(rng.randint(1, 24)):
+            cid = rng.choice(pool)
+            method = rng.random()
+            if(method < 0.6):
+                state.update(cid, rng.randint(-1, state.num_positions))
+            elif(method < 0.8 and cid is not None):
+                state.add_pick(cid, rng.randint(0, state.num_positions))
+            elif(cid is not None):
+                state.add_ban(cid)
+            assert(state.evaluate() == reference_evaluate(state)), "Mismatch for picks {} bans {}".format(state.picks, state.bans)
+            for champion_id in pool[:-2]:
+                assert(state.can_pick(champion_id) == (champion_id not in state.picks))
+                assert(state.can_ban(champion_id) == (champion_id not in state.bans))
+
+def test_frozen_state_pickle():
+    """
+    Checks that frozen draft states remain frozen (and their arrays read-only) after a pickle round trip.
+    """
+    submissions = default_draft_submissions(DraftState.BLUE_TEAM)[:8]
+    state = draft_state_from(submissions)
+    code = state.evaluate()
+    valid_actions = state.get_valid_actions()
+    state.freeze()
+
+    restored = pickle.loads(pickle.dumps(state))
+    assert(restored._frozen)
+    assert(not restored.state.flags.writeable and not restored._valid_actions.flags.writeable)
+    assert(np.array_equal(restored.state, state.state) and np.array_equal(restored.get_valid_actions(), valid_actions))
+    assert(restored.evaluate() == code and restored.picks == state.picks and restored.bans == state.bans)
+    for mutate in [lambda: restored.update(*submissions[-1]), lambda: restored.add_ban(submissions[0][0]), restored.reset]:
+        try:
+            mutate()
+            assert(False), "Frozen state was changed after unpickling"
+        except FrozenDraftState:
+            pass
+    try:
+        restored.state[0,0] = True
+        assert(False), "Frozen state matrix is writeable after unpickling"
+    except ValueError:
+        pass
+
+    # Unfrozen states are restored as unfrozen and can still be updated
+    restored = pickle.loads(pickle.dumps(draft_state_from(submissions[:7])))
+    assert(not restored._frozen and restored.state.flags.writeable)
+    assert(restored.update(*submissions[7]) and restored.evaluate() == code)
+
+def ban_experiences(num_experiences):
+    """
+    Returns a list of num_experiences simple (s, a, r, s') experiences, each banning a different champion from an empty draft.
+    """
+    start = DraftState(DraftState.BLUE_TEAM)
+    start.freeze()
+    experiences = []
+    for cid in get_champion_ids()[:num_experiences]:
+        end = start.copy()
+        end.update(cid, -1)
+        experiences.append((start, (cid, -1), 0., end.freeze()))
+    return experiences
+
+def test_prioritized_sampling(num_batches=5000, batch_size=64, seed=0):
+    """
+    Checks that PrioritizedExperienceBuffer samples each experience in proportion to its priority and that the sum-tree total
+    matches the sum of its leaves.
+    """
+    np.random.seed(seed)
+    buf = PrioritizedExperienceBuffer(max_buffer_size=6, alpha=1.0, epsilon=0.)
+    buf.store(ban_experiences(6))
+    errors = np.array([1., 2., 3., 4., 0.5, 9.5])
+    buf.update_priorities(np.arange(6), errors)
+    leaves = buf._tree[buf._num_leaves-1:]
+    assert(np.isclose(buf._tree[0], leaves.sum()))
+    assert(np.allclose(leaves[:6], errors) and not leaves[6:].any())
+
+    counts = np.zeros(6)
+    for _ in range(num_batches):
+        batch = buf.sample(batch_size)
+        assert(np.allclose(batch["actions"], buf.buffer["actions"][batch["indices"]]))
+        counts += np.bincount(batch["indices"], minlength=6)
+    frequencies = counts/counts.sum()
+    assert(np.allclose(frequencies, errors/errors.sum(), atol=1.e-3)), "Sampled frequencies {} don't match priorities".format(frequencies)
+
+    # Partial updates keep the tree consistent
+    buf.update_priorities(np.array([5, 1]), np.array([0.25, 7.]))
+    assert(np.isclose(buf._tree[0], buf._tree[buf._num_leaves-1:].sum()))
+
+def test_prioritized_overwrite():
+    """
+    Checks that experiences written over the oldest entry once the buffer is full are given the largest priority seen so far.
+    """
+    buf = PrioritizedExperienceBuffer(max_buffer_size=4, alpha=1.0, epsilon=0.)
+    experiences = ban_experiences(6)
+    buf.store(experiences[:4])
+    buf.update_priorities(np.arange(4), np.array([0.5, 5., 2., 1.]))
+    buf.store(experiences[4:])
+    leaves = buf._tree[buf._num_leaves-1:]
+    assert(buf.get_buffer_size() == 4)
+    assert(np.allclose(leaves[:4], [5., 5., 2., 1.]))
+    assert(buf.buffer["actions"][0] == experiences[4][0].get_action(*experiences[4][1]))
+    assert(np.isclose(buf._tree[0], leaves.sum()))
+
+def test_prioritized_sample_clamp():
+    """
+    Checks that round-off in the total priority can't select one of the empty slots at the end of a partially filled buffer.
+    """
+    buf = PrioritizedExperienceBuffer(max_buffer_size=8)
+    buf.store(ban_experiences(3))
+    # Inflate the root sum so that the final samples fall beyond the stored priorities
+    buf._tree[0] *= 1.01
+    batch = buf.sample(200)
+    assert(batch["indices"].max() == buf.get_buffer_size()-1)
+    assert(np.all(np.isfinite(batch["weights"])))
 
 def run():
-    print("HELLO")
+    tests = [test_evaluate_codes, test_evaluate_matches_reference, test_frozen_state_pickle,
+             test_prioritized_sampling, test_prioritized_overwrite, test_prioritized_sample_clamp]
+    for test in tests:
+        test()
+        print("{}: passed".format(test.__name__))
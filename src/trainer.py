@@ -1,9 +1,11 @@
 import time
 import random
-from copy import deepcopy
+import queue
+import threading
+import multiprocessing
+from functools import partial
 
 import tensorflow as tf
-import pandas as pd
 import numpy as np
 
 import data.match_pool as pool
@@ -13,6 +15,61 @@ import features.experience_replay as er
 import features.match_processing as mp
 from features.rewards import get_reward
 
+def get_action_ranks(values, actions):
+    """
+    Ranks the submitted actions amongst all actions according to the values estimated for them.
+    Args:
+        values (numpy array): values[k,a] holds the estimated value (Q-value or probability) of action a for the kth example
+        actions (numpy array): actions[k] is the index of the action submitted in the kth example
+    Returns:
+        ranks (numpy array): ranks[k] is the number of actions valued strictly higher than actions[k] (so the top action has rank 0)
+    """
+    submitted_values = values[np.arange(len(actions)), actions]
+    return np.sum(values > submitted_values[:,np.newaxis], axis=1)
+
+def prefetch(generator, max_prefetch=1):
+    """
+    Runs a generator in a background thread so that its items are produced while the consumer is busy.
+    Args:
+        generator (generator): generator producing the items to be consumed
+        max_prefetch (int): maximum number of items to produce ahead of the consumer
+    Yields:
+        items produced by generator, in order. Exceptions raised by generator are re-raised to the consumer.
+    """
+    items = queue.Queue(maxsize=max_prefetch)
+    done = object()
+    stopped = threading.Event()
+    def put(entry):
+        # Give up if the consumer has stopped so that the thread isn't left blocked on a full queue
+        while not stopped.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in generator:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as err:
+            put((None, err))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            (item, err) = items.get()
+            if err is not None:
+                raise err
+            if item is done:
+                return
+            yield item
+    finally:
+        stopped.set()
+
 class BaseTrainer():
     pass
 
@@ -27,8 +84,10 @@ class DDQNTrainer(BaseTrainer):
         batch_size (int): size of each training set sampled from the replay buffer which will be used to update Qnet at a time
         buffer_size (int): size of replay buffer used
         load_path (string): path to reload existing model
+        num_workers (int): number of worker processes used to process matches into experiences. By default (num_workers <= 1) no
+            worker processes are started and matches are processed by a single background thread instead.
     """
-    def __init__(self, q_network, n_epoch, training_data, validation_data, batch_size, buffer_size, load_path=None):
+    def __init__(self, q_network, n_epoch, training_data, validation_data, batch_size, buffer_size, load_path=None, num_workers=1):
         num_episodes = len(training_data)
         print("***")
         print("Beginning training..")
@@ -46,13 +105,17 @@ class DDQNTrainer(BaseTrainer):
         self.buffer_size = buffer_size
         self.load_path = load_path
 
-        self.replay = er.ExperienceBuffer(self.buffer_size)
+        self.replay = er.PrioritizedExperienceBuffer(self.buffer_size)
+        self.initial_beta = self.replay.beta # Importance-sampling correction is annealed from this value to 1.0 in the final epoch
         self.step_count = 0
         self.epoch_count = 0
 
         self.dampen_states = False
         self.teams = [DraftState.BLUE_TEAM, DraftState.RED_TEAM]
 
+        self.num_workers = num_workers
+        self._workers = None
+
         self.N_TEMP_TRAIN_MATCHES = 25
         self.TEMP_TRAIN_PATCHES = ["8.13","8.14","8.15"]
 
@@ -60,7 +123,10 @@ class DDQNTrainer(BaseTrainer):
         """
         Core training loop over epochs
         """
-        self.target_update_frequency = 10000 # How often to update target network
+        self.update_frequency = 10 # How often to update online network (roughly once per match for each team)
+        # How often to update target network (a hard copy when tau = 1.0). Both frequencies count submissions, so the
+        # target is updated once every 10000 online network updates.
+        self.target_update_frequency = 10000*self.update_frequency
 
         stash_model = True # Flag for stashing a copy of the model
         model_stash_interval = 10 # Stashes a copy of the model this often
@@ -92,29 +158,45 @@ class DDQNTrainer(BaseTrainer):
         # Initialize target network
         self.ddq_net.sess.run(self.ddq_net.target_ops["target_init"])
 
-        for self.epoch_count in range(self.n_epoch):
-            t0 = time.time()
-            learning_rate = self.ddq_net.online_ops["learning_rate"].eval(self.ddq_net.sess)
-            if((self.epoch_count>0) and (self.epoch_count % lr_decay_freq == 0) and (learning_rate>= min_learning_rate)):
-                # Decay learning rate accoring to schedule
-                learning_rate = 0.5*learning_rate
-                self.ddq_net.sess.run(self.ddq_net.online_ops["learning_rate"].assign(learning_rate))
-
-            # Run single epoch of training
-            loss, train_acc, val_acc = self.train_epoch()
-            dt = time.time()-t0
-
-            print(" Finished epoch {:2}/{}: lr: {:.4e}, dt {:.2f}, loss {:.6f}, train {:.6f}, val {:.6f}".format(self.epoch_count+1, self.n_epoch, learning_rate, dt, loss, train_acc, val_acc), flush=True)
-            summaries["loss"].append(loss)
-            summaries["train_acc"].append(train_acc)
-            summaries["val_acc"].append(val_acc)
+        # If requested, matches are processed into experiences by a pool of worker processes which is started once and kept for the
+        # whole run. Workers are spawned rather than forked since this process is already running a TF session.
+        if(self.num_workers > 1):
+            self._workers = multiprocessing.get_context("spawn").Pool(self.num_workers)
+        try:
+            # Validation experiences don't change between epochs so they are only processed once
+            self._train_val_buffer = self.fill_validation_buffer(self.training_data)
+            self._val_buffer = self.fill_validation_buffer(self.validation_data)
 
-            if(stash_model):
-                if(self.epoch_count>0 and (self.epoch_count+1)%model_stash_interval==0):
-                    # Stash a copy of the current model
-                    out_path = "tmp/models/{}_model_E{}.ckpt".format(self.ddq_net._name, self.epoch_count+1)
-                    self.ddq_net.save(path=out_path)
-                    print("Stashed a copy of the current model in {}".format(out_path))
+            # The learning rate is only changed by the schedule below, so its value is read once and tracked here
+            learning_rate = self.ddq_net.online_ops["learning_rate"].eval(self.ddq_net.sess)
+            for self.epoch_count in range(self.n_epoch):
+                t0 = time.time()
+                self.replay.beta = self.initial_beta + (1.-self.initial_beta)*(self.epoch_count+1)/self.n_epoch
+                if((self.epoch_count>0) and (self.epoch_count % lr_decay_freq == 0) and (learning_rate>= min_learning_rate)):
+                    # Decay learning rate accoring to schedule
+                    learning_rate = 0.5*learning_rate
+                    self.ddq_net.sess.run(self.ddq_net.online_ops["set_learning_rate"], feed_dict={self.ddq_net.online_ops["new_learning_rate"]:learning_rate})
+
+                # Run single epoch of training
+                loss, train_acc, val_acc = self.train_epoch()
+                dt = time.time()-t0
+
+                print(" Finished epoch {:2}/{}: lr: {:.4e}, dt {:.2f}, loss {:.6f}, train {:.6f}, val {:.6f}".format(self.epoch_count+1, self.n_epoch, learning_rate, dt, loss, train_acc, val_acc), flush=True)
+                summaries["loss"].append(loss)
+                summaries["train_acc"].append(train_acc)
+                summaries["val_acc"].append(val_acc)
+
+                if(stash_model):
+                    if(self.epoch_count>0 and (self.epoch_count+1)%model_stash_interval==0):
+                        # Stash a copy of the current model
+                        out_path = "tmp/models/{}_model_E{}.ckpt".format(self.ddq_net._name, self.epoch_count+1)
+                        self.ddq_net.save(path=out_path)
+                        print("Stashed a copy of the current model in {}".format(out_path))
+        finally:
+            if(self._workers is not None):
+                self._workers.terminate()
+                self._workers.join()
+                self._workers = None
 
         self.ddq_net.save(path=self.ddq_net._path_to_model)
         return summaries
@@ -128,7 +210,6 @@ class DDQNTrainer(BaseTrainer):
         blank_match = {"winner":None}
 
         learner_submitted_actions = 0
-        null_actions = 0
 
         # Shuffle match presentation order
         if(self.N_TEMP_TRAIN_MATCHES):
@@ -141,66 +222,79 @@ class DDQNTrainer(BaseTrainer):
         data = self.training_data + temp_matches
 
         shuffled_matches = random.sample(data, len(data))
-        for match in shuffled_matches:
-            for team in self.teams:
-                # Process match into individual experiences
-                experiences = mp.process_match(match, team)
-                for pick_id, experience in enumerate(experiences):
-                    # Some experiences include NULL submissions (usually missing bans)
-                    # The learner isn't allowed to submit NULL picks so skip adding these
-                    # to the buffer.
-                    state,actual,_,_ = experience
-                    (cid,pos) = actual
-                    if cid is None:
-                        null_actions += 1
-                        continue
-                    # Store original experience
-                    self.replay.store([experience])
-                    self.step_count += 1
-
-                    # Give model feedback on current estimations
-                    if(self.step_count > self.observations):
-                        # Let the network predict the next action
-                        feed_dict = {self.ddq_net.online_ops["input"]:[state.format_state()],
-                                     self.ddq_net.online_ops["valid_actions"]:[state.get_valid_actions()]}
-                        q_vals = self.ddq_net.sess.run(self.ddq_net.online_ops["valid_outQ"], feed_dict=feed_dict)
-                        sorted_actions = q_vals[0,:].argsort()[::-1]
-                        top_actions = sorted_actions[0:4]
-
-                        if(random.random() < self.epsilon):
-                            pred_act = random.sample(list(top_actions), 1)
-                        else:
-                            # Use model's top prediction
-                            pred_act = [sorted_actions[0]]
-
-                        for action in pred_act:
-                            (cid,pos) = state.format_action(action)
-                            if((cid,pos)!=actual):
-                                pred_state = deepcopy(state)
-                                pred_state.update(cid,pos)
-                                r = get_reward(pred_state, blank_match, (cid,pos), actual)
-                                new_experience = (state, (cid,pos), r, pred_state)
-
-                                self.replay.store([new_experience])
-                                learner_submitted_actions += 1
-
-                    if(self.epsilon > 0.1):
-                        # Reduce epsilon over time
-                        self.epsilon -= self.eps_decay_rate
-
-                    # Use minibatch sample to update online network
-                    if(self.step_count > self.pre_training_steps):
-                        self.train_step()
-
-                    if(self.step_count % self.target_update_frequency == 0):
-                        # After the online network has been updated, update target network
-                        _ = self.ddq_net.sess.run(self.ddq_net.target_ops["target_update"])
+        # Upcoming matches are processed in the background while the network trains on the current one
+        for (experiences, states, valid_actions) in self.generate_experiences(shuffled_matches):
+            if(self.step_count + len(experiences) > self.observations):
+                # Let the network predict the next action for every state in the match with a single call
+                feed_dict = {self.ddq_net.online_ops["input"]:states,
+                             self.ddq_net.online_ops["valid_actions"]:valid_actions}
+                match_q_vals = self.ddq_net.sess.run(self.ddq_net.online_ops["valid_outQ"], feed_dict=feed_dict)
+
+            for pick_id, experience in enumerate(experiences):
+                state,actual,_,_ = experience
+                # Store original experience
+                self.replay.store([experience])
+                self.step_count += 1
+
+                # Give model feedback on current estimations
+                if(self.step_count > self.observations):
+                    sorted_actions = match_q_vals[pick_id,:].argsort()[::-1]
+                    top_actions = sorted_actions[0:4]
+
+                    if(random.random() < self.epsilon):
+                        pred_act = random.sample(list(top_actions), 1)
+                    else:
+                        # Use model's top prediction
+                        pred_act = [sorted_actions[0]]
+
+                    for action in pred_act:
+                        (cid,pos) = state.format_action(action)
+                        if((cid,pos)!=actual):
+                            pred_state = state.copy()
+                            pred_state.update(cid,pos)
+                            pred_state.freeze()
+                            r = get_reward(pred_state, blank_match, (cid,pos), actual)
+                            new_experience = (state, (cid,pos), r, pred_state)
+
+                            self.replay.store([new_experience])
+                            learner_submitted_actions += 1
+
+                if(self.epsilon > 0.1):
+                    # Reduce epsilon over time
+                    self.epsilon -= self.eps_decay_rate
+
+                # Use minibatch sample to update online network
+                if(self.step_count > self.pre_training_steps and self.step_count % self.update_frequency == 0):
+                    self.train_step()
+
+                if(self.step_count % self.target_update_frequency == 0):
+                    # After the online network has been updated, update target network
+                    _ = self.ddq_net.sess.run(self.ddq_net.target_ops["target_update"])
 
         # Get training loss, training_acc, and val_acc to return
-        loss, train_acc = self.validate_model(self.training_data)
-        _, val_acc = self.validate_model(self.validation_data)
+        (loss, train_acc), (_, val_acc) = self.validate_model(self._train_val_buffer, self._val_buffer)
         return (loss, train_acc, val_acc)
 
+    def generate_experiences(self, matches):
+        """
+        Processes matches into the experiences used for training, taking the perspective of each team in turn. Matches are processed
+        ahead of the consumer, either by the trainer's worker processes or (if there are none) by a background thread, and the results
+        are yielded in match order.
+        Args:
+            matches (list(dict)): list of matches to process
+        Yields:
+            (experiences, states, valid_actions) (tuple): for each match and team, the list of experiences along with the stacked
+                formatted starting states and valid actions for those experiences
+        """
+        process = partial(mp.process_match_experiences, teams=self.teams)
+        if(self._workers is not None):
+            processed_matches = self._workers.imap(process, matches, chunksize=8)
+        else:
+            processed_matches = prefetch(map(process, matches), max_prefetch=4)
+        for processed in processed_matches:
+            for item in processed:
+                yield item
+
     def train_step(self):
         """
         Training logic for a single mini-batch update sampled from replay
@@ -208,115 +302,93 @@ class DDQNTrainer(BaseTrainer):
         # Sample training batch from replay
         training_batch = self.replay.sample(self.batch_size)
 
-        # Calculate target Q values for each example:
+        # Target Q values for each example are calculated in the graph:
         # For non-terminal states, targetQ is estimated according to
         #   targetQ = r + gamma*Q'(s',max_a Q(s',a))
         # where Q' denotes the target network.
         # For terminating states the target is computed as
         #   targetQ = r
-        updates = []
-        for exp in training_batch:
-            start,_,reward,end = exp
-            if(self.dampen_states):
-                # To dampen states (usually done after major patches or when the meta shifts)
-                # we replace winning rewards with 0.
-                reward = 0.
-            state_code = end.evaluate()
-            if(state_code==DraftState.DRAFT_COMPLETE or state_code in DraftState.invalid_states):
-                # Action moves to terminal state
-                updates.append(reward)
-            else:
-                # Follwing double DQN paper (https://arxiv.org/abs/1509.06461).
-                #  Action is chosen by online network, but the target network is used to evaluate this policy.
-                # Each row in predicted_Q gives estimated Q(s',a) values for all possible actions for the input state s'.
-                feed_dict = {self.ddq_net.online_ops["input"]:[end.format_state()],
-                             self.ddq_net.online_ops["valid_actions"]:[end.get_valid_actions()]}
-                predicted_action = self.ddq_net.sess.run(self.ddq_net.online_ops["prediction"], feed_dict=feed_dict)[0]
-
-                feed_dict = {self.ddq_net.target_ops["input"]:[end.format_state()]}
-                predicted_Q = self.ddq_net.sess.run(self.ddq_net.target_ops["outQ"], feed_dict=feed_dict)
-
-                updates.append(reward + self.ddq_net.discount_factor*predicted_Q[0,predicted_action])
+        rewards = training_batch["rewards"]
+        if(self.dampen_states):
+            # To dampen states (usually done after major patches or when the meta shifts)
+            # we replace winning rewards with 0.
+            rewards = np.zeros_like(rewards)
 
         # Update online net using target Q
-        # Experience replay stores action = (champion_id, position) pairs
-        # these need to be converted into the corresponding index of the input vector to the Qnet
-        actions = np.array([start.get_action(*exp[1]) for exp in training_batch])
-        targetQ = np.array(updates)
-        feed_dict = {self.ddq_net.online_ops["input"]:np.stack([exp[0].format_state() for exp in training_batch],axis=0),
-                     self.ddq_net.online_ops["actions"]:actions,
-                     self.ddq_net.online_ops["target"]:targetQ,
+        feed_dict = {self.ddq_net.online_ops["input"]:training_batch["states"],
+                     self.ddq_net.online_ops["actions"]:training_batch["actions"],
+                     self.ddq_net.online_ops["rewards"]:rewards,
+                     self.ddq_net.online_ops["next_input"]:training_batch["next_states"],
+                     self.ddq_net.online_ops["next_valid_actions"]:training_batch["next_valid_actions"],
+                     self.ddq_net.online_ops["terminal"]:training_batch["terminal"].astype(np.float32),
+                     self.ddq_net.online_ops["weights"]:training_batch["weights"],
                      self.ddq_net.online_ops["dropout_keep_prob"]:0.5}
-        _ = self.ddq_net.sess.run(self.ddq_net.online_ops["update"],feed_dict=feed_dict)
+        _, td_error = self.ddq_net.sess.run([self.ddq_net.online_ops["double_q_update"], self.ddq_net.online_ops["double_q_td_error"]], feed_dict=feed_dict)
+
+        # Experiences the network was most wrong about are sampled more often
+        self.replay.update_priorities(training_batch["indices"], td_error)
 
-    def validate_model(self, data):
+    def fill_validation_buffer(self, data):
         """
-        Validates given model by computing loss and absolute accuracy for data using current Qnet.
+        Processes matches into the experiences used to validate the model and stores them in a buffer.
+        Only experiences from the winning side of each draft are kept.
         Args:
             data (list(dict)): list of matches to validate against
         Returns:
-            stats (tuple(float)): list of statistical measures of performance. stats = (loss,acc)
+            buf (ExperienceBuffer): buffer holding every validation experience
         """
-        buf = []
-        for match in data:
-            # Loss is only computed for winning side of drafts
-            team = DraftState.RED_TEAM if match["winner"]==1 else DraftState.BLUE_TEAM
-            # Process match into individual experiences
-            experiences = mp.process_match(match, team)
-            for exp in experiences:
-                _,act,_,_ = exp
-                (cid,pos) = act
-                if cid is None:
-                    # Skip null actions such as missing/skipped bans
-                    continue
-                buf.append(exp)
-
-        n_exp = len(buf)
-        targets = []
-        for exp in buf:
-            start,_,reward,end = exp
-            state_code = end.evaluate()
-            if(state_code==DraftState.DRAFT_COMPLETE or state_code in DraftState.invalid_states):
-                # Action moves to terminal state
-                targets.append(reward)
-            else:
-                feed_dict = {self.ddq_net.online_ops["input"]:[end.format_state()],
-                             self.ddq_net.online_ops["valid_actions"]:[end.get_valid_actions()]}
-                predicted_action = self.ddq_net.sess.run(self.ddq_net.online_ops["prediction"], feed_dict=feed_dict)[0]
-
-                feed_dict = {self.ddq_net.target_ops["input"]:[end.format_state()]}
-                predicted_Q = self.ddq_net.sess.run(self.ddq_net.target_ops["outQ"], feed_dict=feed_dict)
-
-                targets.append(reward + self.ddq_net.discount_factor*predicted_Q[0,predicted_action])
-
-        actions = np.array([start.get_action(*exp[1]) for exp in buf])
-        targets = np.array(targets)
-
-        feed_dict = {self.ddq_net.online_ops["input"]:np.stack([exp[0].format_state() for exp in buf],axis=0),
-                     self.ddq_net.online_ops["actions"]:actions,
-                     self.ddq_net.online_ops["target"]:targets,
-                     self.ddq_net.online_ops["valid_actions"]:np.stack([exp[0].get_valid_actions() for exp in buf],axis=0)}
-
-        loss, pred_q = self.ddq_net.sess.run([self.ddq_net.online_ops["loss"], self.ddq_net.online_ops["valid_outQ"]],feed_dict=feed_dict)
-
-        accurate_predictions = 0
+        # Loss is only computed for winning side of drafts
+        tasks = [(match, [DraftState.RED_TEAM if match["winner"]==1 else DraftState.BLUE_TEAM]) for match in data]
+        if(self._workers is not None):
+            processed_matches = self._workers.starmap(mp.process_match_experiences, tasks)
+        else:
+            processed_matches = [mp.process_match_experiences(*task) for task in tasks]
+        experiences = []
+        # Null actions such as missing/skipped bans are already removed by process_match_experiences()
+        for processed in processed_matches:
+            for (exps, _, _) in processed:
+                experiences.extend(exps)
+
+        buf = er.ExperienceBuffer(max_buffer_size=len(experiences))
+        buf.store(experiences)
+        return buf
+
+    def validate_model(self, *buffers):
+        """
+        Validates given model by computing loss and absolute accuracy for each buffer of experiences using current Qnet.
+        Every buffer is evaluated together in a single pass through the network.
+        Args:
+            buffers (ExperienceBuffer): one or more buffers of experiences to validate against (see fill_validation_buffer())
+        Returns:
+            stats (list(tuple(float))): list of statistical measures of performance for each buffer. stats[k] = (loss,acc) for buffers[k]
+        """
+        batches = [buf.sample(buf.get_buffer_size()) for buf in buffers]
+
+        # Evaluate the errors and Q-values for all buffers in a single call
+        batch = {key:np.concatenate([b[key] for b in batches], axis=0) for key in batches[0]}
+        feed_dict = {self.ddq_net.online_ops["input"]:batch["states"],
+                     self.ddq_net.online_ops["actions"]:batch["actions"],
+                     self.ddq_net.online_ops["valid_actions"]:batch["valid_actions"],
+                     self.ddq_net.online_ops["rewards"]:batch["rewards"],
+                     self.ddq_net.online_ops["next_input"]:batch["next_states"],
+                     self.ddq_net.online_ops["next_valid_actions"]:batch["next_valid_actions"],
+                     self.ddq_net.online_ops["terminal"]:batch["terminal"].astype(np.float32)}
+        td_error, pred_q = self.ddq_net.sess.run([self.ddq_net.online_ops["double_q_td_error"], self.ddq_net.online_ops["valid_outQ"]], feed_dict=feed_dict)
+
+        # A prediction is accurate if the submitted action is ranked within the top rank_tolerance actions
         rank_tolerance = 5
-        for n in range(n_exp):
-            state,act,_,_ = buf[n]
-            submitted_action_id = state.get_action(*act)
-
-            data = [(a,pred_q[n,a]) for a in range(pred_q.shape[1])]
-            df = pd.DataFrame(data, columns=['act_id','Q'])
-            df.sort_values('Q',ascending=False,inplace=True)
-            df.reset_index(drop=True,inplace=True)
-            df['rank'] = df.index
-            submitted_row = df[df['act_id']==submitted_action_id]
-            rank = submitted_row['rank'].iloc[0]
-            if rank < rank_tolerance:
-                accurate_predictions += 1
-
-        accuracy = accurate_predictions/n_exp
-        return (loss, accuracy)
+        accurate = get_action_ranks(pred_q, batch["actions"]) < rank_tolerance
+
+        # Split results back out by buffer
+        stats = []
+        start = 0
+        for b in batches:
+            end = start+len(b["actions"])
+            loss = np.mean(0.5*np.square(td_error[start:end]))
+            accuracy = np.mean(accurate[start:end])
+            stats.append((loss, accuracy))
+            start = end
+        return stats
 
 class SoftmaxTrainer(BaseTrainer):
     def __init__(self, network, n_epoch, training_data, validation_data, batch_size, load_path=None):
@@ -359,15 +431,7 @@ class SoftmaxTrainer(BaseTrainer):
 
     def sample_buffer(self, buf, n_samples):
         experiences = buf.sample(n_samples)
-        states = []
-        actions = []
-        valid_actions = []
-        for (state, action, _, _) in experiences:
-            states.append(state.format_state())
-            valid_actions.append(state.get_valid_actions())
-            actions.append(state.get_action(*action))
-
-        return (states, actions, valid_actions)
+        return (experiences["states"], experiences["actions"], experiences["valid_actions"])
 
     def train(self):
         summaries = {}
@@ -387,12 +451,13 @@ class SoftmaxTrainer(BaseTrainer):
             self.model.load(self.load_path)
             print("\nCheckpoint loaded from {}".format(self.load_path))
 
+        # The learning rate is only changed by the schedule below, so its value is read once and tracked here
+        learning_rate = self.model.ops_dict["learning_rate"].eval(self.model.sess)
         for self.epoch_count in range(self.n_epoch):
-            learning_rate = self.model.ops_dict["learning_rate"].eval(self.model.sess)
             if((self.epoch_count>0) and (self.epoch_count % lr_decay_freq == 0) and (learning_rate>= min_learning_rate)):
                 # Decay learning rate accoring to schedule
                 learning_rate = 0.5*learning_rate
-                self.model.sess.run(self.model.ops_dict["learning_rate"].assign(learning_rate))
+                self.model.sess.run(self.model.ops_dict["set_learning_rate"], feed_dict={self.model.ops_dict["new_learning_rate"]:learning_rate})
 
             t0 =  time.time()
             loss, train_acc, val_acc = self.train_epoch()
@@ -426,8 +491,8 @@ class SoftmaxTrainer(BaseTrainer):
     def train_step(self):
         states, actions, valid_actions = self.sample_buffer(self._buffer, self.batch_size)
 
-        feed_dict = {self.model.ops_dict["input"]:np.stack(states, axis=0),
-                     self.model.ops_dict["valid_actions"]:np.stack(valid_actions, axis=0),
+        feed_dict = {self.model.ops_dict["input"]:states,
+                     self.model.ops_dict["valid_actions"]:valid_actions,
                      self.model.ops_dict["actions"]:actions,
                      self.model.ops_dict["dropout_keep_prob"]:0.5}
         _  = self.model.sess.run(self.model.ops_dict["update"], feed_dict=feed_dict)
@@ -435,28 +500,11 @@ class SoftmaxTrainer(BaseTrainer):
     def validate_model(self, buf):
         states, actions, valid_actions = self.sample_buffer(buf, buf.get_buffer_size())
 
-        feed_dict = {self.model.ops_dict["input"]:np.stack(states, axis=0),
-                     self.model.ops_dict["valid_actions"]:np.stack(valid_actions, axis=0),
+        feed_dict = {self.model.ops_dict["input"]:states,
+                     self.model.ops_dict["valid_actions"]:valid_actions,
                      self.model.ops_dict["actions"]:actions}
         loss, train_probs = self.model.sess.run([self.model.ops_dict["loss"], self.model.ops_dict["probabilities"]], feed_dict=feed_dict)
 
         THRESHOLD = 5
-        accurate_predictions = 0
-        for k in range(len(states)):
-            probabilities = train_probs[k,:]
-            data = [(a, probabilities[a]) for a in range(len(probabilities))]
-            df = pd.DataFrame(data, columns=['act_id','prob'])
-
-            df.sort_values('prob',ascending=False,inplace=True)
-            df.reset_index(drop=True,inplace=True)
-            df['rank'] = df.index
-
-            submitted_action_id = actions[k]
-            submitted_row = df[df['act_id']==submitted_action_id]
-
-            rank = submitted_row['rank'].iloc[0]
-            if(rank < THRESHOLD):
-                accurate_predictions += 1
-
-        accuracy = accurate_predictions/len(states)
+        accuracy = np.mean(get_action_ranks(train_probs, actions) < THRESHOLD)
         return (loss, accuracy)